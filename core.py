@@ -3,14 +3,51 @@
 See overview-aoc.ipynb for more information.
 """
 
-from dataclasses import dataclass, field
+import re
+from dataclasses import MISSING, dataclass, field, fields
 
+from rapidfuzz import utils
 
-@dataclass
+# Climber initials as whole words, e.g. "TA" and "AS" in "Rumney TA AS w/ Art"
+CLIMBERS_RE = re.compile(r"\b(TA|AS)\b")
+
+
+def get_climbers(text: str) -> list[str]:
+    """Get the climbers mentioned in ``text``, e.g. ["TA", "AS"]."""
+    climbers = set(CLIMBERS_RE.findall(text))
+    return [climber for climber in ["TA", "AS"] if climber in climbers]
+
+
+def _setstate(self, state):
+    """Set dataclass fields from pickled ``state``.
+
+    This supports pickles made before the dataclasses used slots, where ``state`` is
+    the instance ``__dict__``. Fields missing from ``state`` because they were added
+    later get their default value.
+    """
+    if isinstance(state, tuple):
+        # (None, slot_state) from object.__getstate__ for a slots instance
+        _, state = state
+    elif isinstance(state, list):
+        # Field values from the dataclass __getstate__ for a frozen slots instance
+        state = {fld.name: value for fld, value in zip(fields(self), state)}
+    for fld in fields(self):
+        if fld.name in state:
+            value = state[fld.name]
+        elif fld.default_factory is not MISSING:
+            value = fld.default_factory()
+        elif fld.default is not MISSING:
+            value = fld.default
+        else:
+            continue
+        object.__setattr__(self, fld.name, value)
+
+
+@dataclass(frozen=True, slots=True)
 class ClimbInfo:
     """Information about a climb at Rumney.
 
-    This is like the guidebook, not a specific ascent of the climb.
+    This is like the guidebook, not a specific ascent of the climb. It is immutable.
 
     Parameters
     ----------
@@ -18,19 +55,35 @@ class ClimbInfo:
         The name of the climb, e.g. "Kundalini"
     grade : str
         The grade of the climb, e.g. "5.12d"
-    aliases : list[str]
-        A list of aliases for the climb, e.g. ["Kunda"]
+    aliases : tuple[str, ...]
+        Aliases for the climb, e.g. ("Kunda",)
+    processed_aliases : tuple[str, ...]
+        The aliases normalized for fuzzy matching (lower case, no punctuation), e.g.
+        ("kunda",). This is computed from ``aliases`` when the climb is created or
+        loaded from a shelf made before this field existed.
     """
 
     name: str
     grade: str
-    aliases: list[str] = field(default_factory=list)
+    aliases: tuple[str, ...] = ()
+    processed_aliases: tuple[str, ...] = field(default=(), init=False)
+
+    def __post_init__(self):
+        processed_aliases = tuple(
+            utils.default_process(alias) for alias in self.aliases
+        )
+        object.__setattr__(self, "processed_aliases", processed_aliases)
+
+    def __setstate__(self, state):
+        _setstate(self, state)
+        if not self.processed_aliases:
+            self.__post_init__()
 
     def __str__(self):
         return f"{self.name}: {self.grade}"
 
 
-@dataclass
+@dataclass(slots=True)
 class ClimbingDay:
     """A day of climbing.
 
@@ -45,6 +98,8 @@ class ClimbingDay:
         (TA, AS found new beta), Espresso (TA)"
     place_and_climbers : str
         The place and climbers for the day, e.g. "Rumney TA AS w/ Art"
+    base_climbers : list[str]
+        The climbers for the day from place_and_climbers, e.g. ["TA", "AS"]
     climb_entries : list[ClimbEntry]
         A list of ClimbEntry objects corresponding to this day.
     """
@@ -52,10 +107,13 @@ class ClimbingDay:
     date: str
     log_text: str
     place_and_climbers: str
+    base_climbers: list[str] = field(default_factory=list)
     climb_entries: list["ClimbEntry"] = field(default_factory=list)
 
+    __setstate__ = _setstate
 
-@dataclass
+
+@dataclass(slots=True)
 class ClimbEntry:
     """Climb on a date.
 
@@ -78,7 +136,7 @@ class ClimbEntry:
         useful information about the climb, like who did it and repetitions and hangs.
     climbers : list[str]
         A initial list of climbers who did the climb based on the ClimbingDay
-        place_and_climbers. It may be overridden by information in the comment.
+        base_climbers. It may be overridden by information in the comment.
     climb_info : ClimbInfo
         Information about the climb itself (name, grade, aliases).
     climb_events : list[ClimbEvent]
@@ -94,8 +152,10 @@ class ClimbEntry:
     climb_events: list["ClimbEvent"] = field(default_factory=list)
     idx_entry_start: int = 0
 
+    __setstate__ = _setstate
+
     def __post_init__(self):
-        climbers = [climber for climber in ["TA", "AS"] if climber in self.comment]
+        climbers = get_climbers(self.comment)
         if climbers == []:
             climbers = self.climbers.copy()
         for climber in climbers:
@@ -124,7 +184,7 @@ class ClimbEntry:
         self.climb_events = new_climb_events
 
 
-@dataclass
+@dataclass(slots=True)
 class ClimbEvent:
     """A person doing a climb.
 
@@ -141,5 +201,7 @@ class ClimbEvent:
     climber: str
     hang: bool
 
+    __setstate__ = _setstate
+
     def __str__(self):
         return f"{self.climber}{' (hang)' if self.hang else ''}"
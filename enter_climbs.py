@@ -1,21 +1,27 @@
 import argparse
-import os
+import email.utils
+import functools
+import heapq
+import io
 from pathlib import Path
+import pickle
 import re
 import shelve
 import shutil
+import sys
 import textwrap
 import typing
 import curses.ascii
 import time
 
 import numpy as np
+import pandas as pd
 import requests
 from astropy.table import Table
-from thefuzz import fuzz
+from rapidfuzz import fuzz, process, utils
 from astropy.utils.console import Getch
 
-from core import ClimbEntry, ClimbInfo, ClimbEvent, ClimbingDay
+from core import ClimbEntry, ClimbInfo, ClimbEvent, ClimbingDay, get_climbers
 from doc_ids import DOC_ID, GIDS
 
 # URL to download exclude Times google sheet
@@ -27,24 +33,49 @@ ATK_SHEET_URL = (
     "&gid={gid}"
 )
 
+# Local cache of downloaded ATK sheets
+ATK_CACHE_DIR = Path.home() / ".cache" / "climb-stats"
+
+# Climb entry in a log text: everything up to a separator outside of parentheses. A
+# separator just after a "5" (as in "5.10a") does not end the entry.
+ENTRY_RE = re.compile(r"(?:\([^)]*\)?|(?<=5)[,.;!:\-]|[^(,.;!:\-])+")
+
+# Parenthesized comment within a climb entry
+COMMENT_RE = re.compile(r"\(([^)]*)\)?")
+
+# Caret in the curses representation of a control character, e.g. "^A"
+CTRL_RE = re.compile(r"\^")
+
+# Flattened (name, alias, alias_len, processed_alias) for every alias of every climb,
+# set by build_alias_index().
+_ALIAS_INDEX: list[tuple[str, str, int, str]] = []
+
 get_key_no_echo: typing.Callable = Getch()
 
 
-def get_key(delay=0) -> str:
-    """Get a single character from standard input without screen echo."""
-    out = get_key_no_echo()
-    if delay > 0:
-        from pyfiglet import figlet_format
+def get_key_reader(delay: float = 0) -> typing.Callable[[], str]:
+    """Get a function that reads a single character from standard input without echo.
 
+    If ``delay`` is set then the returned function also shows each key press in large
+    text and pauses for ``delay`` seconds, e.g. for a demo.
+    """
+    if not delay:
+        return get_key_no_echo
+
+    from pyfiglet import figlet_format
+
+    def get_key() -> str:
+        out = get_key_no_echo()
         key_repr = curses.ascii.unctrl(out)
         if key_repr == " ":
             key_repr = "<space>"
-        key_repr = re.sub(r"\^", "<ctrl>-", key_repr)
+        key_repr = CTRL_RE.sub("<ctrl>-", key_repr)
         print()
         print(figlet_format(key_repr, font="univers"))
         time.sleep(delay)
+        return out
 
-    return out
+    return get_key
 
 
 def print_long_repr_of_char(char: str) -> None:
@@ -62,32 +93,61 @@ def print_long_repr_of_char(char: str) -> None:
         print(char)
 
 
-def get_log_entries_for_date(date: str) -> Table:
-    """Get log entries for a date from the ATK sheet.
+def get_atk_sheet_csv(gid: str, refresh: bool = False) -> bytes:
+    """Get the CSV contents of the ATK sheet for ``gid``.
 
-    ``date`` can be any portion of an ISO date, e.g. "2024" or "2024-06-01", where the
-    output will be filtered by matching the start of the date string.
+    The download is cached in ``ATK_CACHE_DIR``. If there is a cached copy then its
+    modification time is sent as If-Modified-Since and the cached copy is used if the
+    sheet has not changed (HTTP 304). Set ``refresh`` to always download the sheet.
     """
-    url = ATK_SHEET_URL.format(doc_id=DOC_ID, gid=GIDS[date[:4]])
+    url = ATK_SHEET_URL.format(doc_id=DOC_ID, gid=gid)
+    cache_path = ATK_CACHE_DIR / f"{gid}.csv"
+    headers = {}
+    if cache_path.exists() and not refresh:
+        mtime = cache_path.stat().st_mtime
+        headers["If-Modified-Since"] = email.utils.formatdate(mtime, usegmt=True)
+
     print(f"Getting ATK climbs from {url}")
-    req = requests.get(url, timeout=30)
+    req = requests.get(url, headers=headers, timeout=30)
+    if req.status_code == 304:
+        print(f"Using cached ATK climbs from {cache_path}")
+        return cache_path.read_bytes()
     if req.status_code != 200:
         raise ValueError(f"Failed to get exclude times sheet {url}: {req.status_code}")
 
-    out = Table.read(req.text, format="csv", fill_values=[])
-    out = out[:369]
-    ok0 = np.array(["rumney" in climb.lower() for climb in out["Climb"]])
-    ok1 = np.array([date.strip() != "" for date in out["Date"]])
-    log_entries = out["Date", "Climb", "Comments"][ok0 & ok1]
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_bytes(req.content)
+    return req.content
+
+
+def get_log_entries_for_date(date: str, refresh: bool = False) -> pd.DataFrame:
+    """Get log entries for a date from the ATK sheet.
+
+    ``date`` can be any portion of an ISO date, e.g. "2024" or "2024-06-01", where the
+    output will be filtered by matching the start of the date string. Set ``refresh``
+    to download the sheet even if the cached copy is current.
+    """
+    content = get_atk_sheet_csv(GIDS[date[:4]], refresh=refresh)
+
+    out = pd.read_csv(
+        io.BytesIO(content),
+        usecols=["Date", "Climb", "Comments"],
+        dtype=str,
+        keep_default_na=False,
+        engine="pyarrow",
+        dtype_backend="pyarrow",
+    )
+    out = out.iloc[:369]
+    ok0 = out["Climb"].str.contains("rumney", case=False, na=False, regex=False)
+    ok1 = out["Date"].str.strip() != ""
+    log_entries = out[ok0 & ok1].copy()
 
     # Convert date to ISO format
-    dates = [date.split("/") for date in log_entries["Date"]]
-    dates = [(int(year), int(mon), int(day)) for mon, day, year in dates]
-    log_entries["Date"] = [f"{year}-{mon:02d}-{day:02d}" for year, mon, day in dates]
+    dates = pd.to_datetime(log_entries["Date"], format="%m/%d/%Y")
+    log_entries["Date"] = dates.dt.strftime("%Y-%m-%d")
 
     # Filter by date
-    ok = [date_iso.startswith(date) for date_iso in log_entries["Date"]]
-    log_entries = log_entries[ok]
+    log_entries = log_entries[log_entries["Date"].str.startswith(date)]
 
     return log_entries
 
@@ -107,16 +167,22 @@ def get_arg_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Use demo files",
     )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Download the ATK sheet even if the cached copy is current",
+    )
     parser.add_argument(
         "--delay",
         type=float,
+        default=0,
         help="Show each key press and delay for this many seconds",
     )
     return parser
 
 
 def get_climb_entries_from_climbing_day(
-    comment: str, date: str, place_and_climbers: str
+    comment: str, date: str, climbers: list[str]
 ) -> list[ClimbEntry]:
     """Get a list of ClimbEntry objects from the comments field of the ATK sheet.
 
@@ -129,47 +195,26 @@ def get_climb_entries_from_climbing_day(
     did it and repetitions and hangs. A ClimbEntry can contain multiple ClimbEvent
     objects, each corresponding to one climber getting on the route once.
 
-    This function works as a state machine, parsing the comment character by character.
-    This is a bad way to do it, but it works well enough for this use case. A more
-    robust solution would be to use a parser generator like PLY.
+    Entries are separated by any of ``,.;!:-`` outside of parentheses, except that a
+    separator right after a "5" is taken to be part of a grade like "5.10a".
     """
-    state = "name"
     climb_entries = []
-    name_approx = ""
-    climb_comment = ""
-    comment_len = len(comment)
-    climbers = [climber for climber in ["TA", "AS"] if climber in place_and_climbers]
-    idx_entry_start = 0
-
-    for idx, char in enumerate(comment):
-        if char == "(":
-            state = "comment"
+    for match in ENTRY_RE.finditer(comment):
+        entry_text = match.group()
+        name_approx = COMMENT_RE.sub("", entry_text).replace(")", "").strip()
+        climb_comment = "".join(COMMENT_RE.findall(entry_text)).strip()
+        if not name_approx and not climb_comment:
+            # Only whitespace between two separators
             continue
-        if char == ")":
-            state = "name"
-            if idx != comment_len - 1:
-                continue
-        if (
-            state == "name"
-            and (char in (",", ".", ";", "!", ":", "-") or idx == comment_len - 1)
-            and not (name_approx and name_approx[-1] == "5")
-        ):
-            # Create ClimbEntry. Exact name and climb_events to be filled later.
-            climb_entry = ClimbEntry(
-                name_approx=name_approx.strip(),
-                comment=climb_comment.strip(),
-                climbers=climbers,
-                idx_entry_start=idx_entry_start,
-            )
-            climb_entries.append(climb_entry)
-            name_approx = ""
-            climb_comment = ""
-            idx_entry_start = idx + 1
-            continue
-        if state == "name":
-            name_approx += char
-        if state == "comment":
-            climb_comment += char
+
+        # Create ClimbEntry. Exact name and climb_events to be filled later.
+        climb_entry = ClimbEntry(
+            name_approx=name_approx,
+            comment=climb_comment,
+            climbers=climbers,
+            idx_entry_start=match.start(),
+        )
+        climb_entries.append(climb_entry)
 
     return climb_entries
 
@@ -199,29 +244,35 @@ def process_climb_entry(
 
     A ClimbEvent is a specific ascent of a climb.
     """
-    matches = get_matches(climb_entry, climbs_info)
+    matches = get_matches(climb_entry)
 
     if climb_entry.climb_info is None:
         climb_entry.climb_info = climbs_info[matches["name"][0]]
 
     log_text = "\n".join(textwrap.wrap(climbing_day.log_text, width=100))
+    log_text_bold = make_bold(log_text, climb_entry)
+    matches_text = str(matches[:8])
+    get_key = get_key_reader(delay)
 
     done = False
     while not done:
-        os.system("clear")
-        print("=" * 80)
-        print(climbing_day.date, climbing_day.place_and_climbers)
-        print(make_bold(log_text, climb_entry))
-        print()
-        print(climb_entry)
-        print("=" * 80)
-        print()
-        print(matches[:8])
-        print()
-        print(
-            "<space>, q(uit), [a,t]: 1h, [A,T: custom], ctrl-[a,t]: remove, 0..7, c(limb name) n(ot a climb)"
-        )
-        key = get_key(delay)
+        # Clear screen and scrollback without spawning a `clear` subprocess, then
+        # redraw everything with a single write.
+        lines = [
+            "\033[H\033[2J\033[3J" + "=" * 80,
+            f"{climbing_day.date} {climbing_day.place_and_climbers}",
+            log_text_bold,
+            "",
+            str(climb_entry),
+            "=" * 80,
+            "",
+            matches_text,
+            "",
+            "<space>, q(uit), [a,t]: 1h, [A,T: custom], ctrl-[a,t]: remove, 0..7, c(limb name) n(ot a climb)",
+        ]
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+        key = get_key()
 
         if key in [" ", "q"]:
             done = True
@@ -240,15 +291,12 @@ def process_climb_entry(
                 climb_info = climbs_info[name]
             else:
                 grade = input("Enter climb grade: ")
-                climb_info = ClimbInfo(
-                    name=name,
-                    grade=grade,
-                    aliases=[name],
-                )
+                climb_info = ClimbInfo(name=name, grade=grade, aliases=(name,))
                 print(climb_info)
                 update = input("Update climbs_info (y/n)?")
                 if update == "y":
                     climbs_info[name] = climb_info
+                    build_alias_index(climbs_info)
             climb_entry.climb_info = climb_info
         elif key == "n":
             climb_entry.climb_info = None
@@ -258,27 +306,86 @@ def process_climb_entry(
     return key
 
 
-def get_matches(climb_entry: ClimbEntry, climbs_info: ClimbInfo) -> Table:
+def build_alias_index(climbs_info: dict[str, ClimbInfo]) -> None:
+    """Build the alias index of ``climbs_info`` used by get_matches.
+
+    This must be called after loading ``climbs_info`` and whenever a climb is added.
+    """
+    global _ALIAS_INDEX
+
+    _ALIAS_INDEX = [
+        (climb_name, alias, len(alias), processed_alias)
+        for climb_name, climb_info in climbs_info.items()
+        for alias, processed_alias in zip(
+            climb_info.aliases, climb_info.processed_aliases
+        )
+    ]
+    get_match_scores.cache_clear()
+
+
+@functools.lru_cache(maxsize=4096)
+def get_match_scores(name_approx: str) -> np.ndarray:
+    """Get the fuzzy match score of ``name_approx`` against each alias in the index.
+
+    The same approximate names (e.g. "Idiot") recur across climbing days while the
+    aliases stay fixed, so the scores are cached until the alias index is rebuilt.
+    The returned array is read-only.
+
+    An alias that appears as whole words in ``name_approx`` gets a score of 950
+    without running the fuzzy scorer.
+    """
+    query = utils.default_process(name_approx)
+    query_padded = f" {query} "
+    scores = np.full(len(_ALIAS_INDEX), 950, dtype=int)
+    idxs = [
+        idx
+        for idx, (_, _, _, processed_alias) in enumerate(_ALIAS_INDEX)
+        # Alias appears as whole words in name_approx, e.g. "2 runs on Idiot"
+        if not (processed_alias and f" {processed_alias} " in query_padded)
+    ]
+
+    if idxs:
+        # Aliases are already normalized so only name_approx needs processing here
+        fuzzy_scores = process.cdist(
+            [query],
+            [_ALIAS_INDEX[idx][3] for idx in idxs],
+            scorer=fuzz.partial_token_sort_ratio,
+            processor=None,
+            workers=-1,
+        )[0]
+        scores[idxs] = np.rint(fuzzy_scores)
+    scores.setflags(write=False)
+    return scores
+
+
+def get_matches(climb_entry: ClimbEntry) -> Table:
     """Get a table of climb name matches for a ClimbEntry object.
 
-    This does a fuzzy match of the approximate climb name in the ClimbEntry object.
+    This does a fuzzy match of the approximate climb name in the ClimbEntry object
+    against the aliases from build_alias_index(). An alias that is exactly the
+    approximate climb name gets a score of 1000, so it comes first while the fuzzy
+    matches are still offered in case it is the wrong pick.
     """
-    rows = []
-    for climb_name, climb_info in climbs_info.items():
-        for alias in climb_info.aliases:
-            if climb_entry.name_approx == alias:
-                match = 1000
-            else:
-                match = fuzz.partial_token_sort_ratio(climb_entry.name_approx, alias)
-            row = (match, climb_name, alias, len(alias))
-            rows.append(row)
-    matches = Table(rows=rows, names=["match", "name", "alias", "alias_len"])
-    matches.sort(("match", "alias_len"), reverse=True)
-    if matches["match"][0] <= 60:
-        matches = matches[:4]
+    name_approx = climb_entry.name_approx
+    names = ["Select", "match", "name", "alias", "alias_len"]
+    scores = get_match_scores(name_approx).tolist()
+    candidates = (
+        (1000 if alias == name_approx else score, alias_len, climb_name, alias)
+        for score, (climb_name, alias, alias_len, _) in zip(scores, _ALIAS_INDEX)
+    )
+
+    # Only the top 8 by (match, alias_len) are shown so skip a full sort
+    top_matches = heapq.nlargest(8, candidates)
+    if top_matches[0][0] <= 60:
+        top_matches = top_matches[:4]
     else:
-        matches = matches[matches["match"] >= 60]
-    matches.add_column(np.arange(len(matches)), index=0, name="Select")
+        top_matches = [top_match for top_match in top_matches if top_match[0] >= 60]
+
+    rows = [
+        (idx, match, climb_name, alias, alias_len)
+        for idx, (match, alias_len, climb_name, alias) in enumerate(top_matches)
+    ]
+    matches = Table(rows=rows, names=names)
     return matches
 
 
@@ -314,7 +421,7 @@ def get_new_climb_events(key: str) -> tuple[str, list[ClimbEvent]]:
 
 
 def process_log_entries(
-    log_entries: Table,
+    log_entries: pd.DataFrame,
     climbs_info: dict[str, ClimbInfo],
     climbing_days: dict[str, ClimbingDay],
     force: bool = False,
@@ -324,7 +431,7 @@ def process_log_entries(
 
     This updates `climbs_info` and `climbing_days` with new entries.
     """
-    for log_entry in log_entries:
+    for log_entry in log_entries.to_dict("records"):
         date = log_entry["Date"]
         log_text = log_entry["Comments"]
         place_and_climbers = log_entry["Climb"]
@@ -333,11 +440,14 @@ def process_log_entries(
             continue
 
         climbing_day = ClimbingDay(
-            date=date, log_text=log_text, place_and_climbers=place_and_climbers
+            date=date,
+            log_text=log_text,
+            place_and_climbers=place_and_climbers,
+            base_climbers=get_climbers(place_and_climbers),
         )
 
         climb_entries = get_climb_entries_from_climbing_day(
-            log_text, date, place_and_climbers
+            log_text, date, climbing_day.base_climbers
         )
 
         for climb_entry in climb_entries:
@@ -381,12 +491,14 @@ def get_file_paths(demo: bool) -> tuple[str, str]:
 def main():
     parser = get_arg_parser()
     args = parser.parse_args()
-    log_entries = get_log_entries_for_date(args.date)
+    log_entries = get_log_entries_for_date(args.date, refresh=args.refresh)
 
     climbing_days_db, climbs_info_db = get_file_paths(args.demo)
 
-    with shelve.open(climbing_days_db) as climbing_days:
-        with shelve.open(climbs_info_db) as climbs_info:
+    shelve_kwargs = {"protocol": pickle.HIGHEST_PROTOCOL, "writeback": False}
+    with shelve.open(climbing_days_db, **shelve_kwargs) as climbing_days:
+        with shelve.open(climbs_info_db, **shelve_kwargs) as climbs_info:
+            build_alias_index(climbs_info)
             process_log_entries(
                 log_entries,
                 climbs_info,
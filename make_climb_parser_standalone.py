@@ -0,0 +1,24 @@
+"""One-off to make climb_parser_standalone.py from the climbing_log.lark grammar.
+
+Run this again whenever climbing_log.lark changes. The generated module lets
+parse_lark.py skip loading and compiling the grammar at import.
+"""
+
+from pathlib import Path
+
+from lark import Lark
+from lark.tools.standalone import gen_standalone
+
+GRAMMAR_PATH = Path(__file__).with_name("climbing_log.lark")
+STANDALONE_PATH = Path(__file__).with_name("climb_parser_standalone.py")
+
+
+def main():
+    lark_inst = Lark(GRAMMAR_PATH.read_text(), start="start", parser="lalr")
+    with open(STANDALONE_PATH, "w") as out:
+        gen_standalone(lark_inst, out=out)
+    print(f"Wrote {STANDALONE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
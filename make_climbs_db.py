@@ -1,5 +1,6 @@
 """One-off to make climbs.db shelf file from climbs in scrape-atk.ipynb"""
 
+import pickle
 import shelve
 
 from core import ClimbInfo
@@ -70,11 +71,13 @@ CLIMBS_LIST = {
 }
 
 def main():
-    with shelve.open("climb_info") as db:
+    with shelve.open(
+        "climb_info", protocol=pickle.HIGHEST_PROTOCOL, writeback=False
+    ) as db:
         for names, grade in CLIMBS_LIST.items():
             if not isinstance(names, tuple):
                 names = (names,)
-            climb = ClimbInfo(name=names[0], grade=grade, aliases=list(names))
+            climb = ClimbInfo(name=names[0], grade=grade, aliases=names)
             db[climb.name] = climb
             print(climb)
 
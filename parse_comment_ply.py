@@ -7,22 +7,39 @@ An example of a log entry string is below:
 A log entry string is a series of climb entries separated by semicolons, commas or
 periods. Each climb entry has a climb name and possibly a comment in parentheses.
 
-The output should be a list of dictionaries, one for each climb entry. Each dictionary
-should have a "name" key and a "comment" key.
+The output is a list of Entry named tuples, one for each climb entry, with "name" and
+"comment" fields. These are much smaller than a dict per entry.
 
 For the example above, the output would be:
 
 [
-    {"name": "Armed", "comment": ""},
-    {"name": "Obi", "comment": "(AS)"},
-    {"name": "Jedi Mind Tricks * 2", "comment": "TA working moves"}
+    Entry(name="Armed", comment=""),
+    Entry(name="Obi", comment="AS"),
+    Entry(name="Jedi Mind Tricks * 2", comment="TA working moves"),
 ]
 
 Use the PLY package to parse the string by defining the tokens and grammar rules.
+
+PLY is pure Python so this runs unmodified under PyPy, whose JIT makes parsing many
+times faster. Use PyPy for batch processing of log entries.
 """
+import functools
+import platform
+import re
+import sys
+from collections import namedtuple
+from pathlib import Path
+
 import ply.lex as lex
 import ply.yacc as yacc
 
+# Cache of the parser LR tables. PLY checks a signature of the grammar when loading
+# this and rebuilds the tables if the grammar has changed.
+PARSER_TABLES_PATH = Path(__file__).with_name("parse_comment_ply_tables.pickle")
+
+# Parsed climb entry
+Entry = namedtuple("Entry", ["name", "comment"])
+
 # Token definitions for the lexer
 tokens = (
     'NAME',
@@ -30,16 +47,20 @@ tokens = (
     "SEPARATOR",
 )
 
-# Regular expression rules for tokens
+# Regular expression rules for tokens. The named group captures just the comment text
+# inside the parentheses, so no slicing is needed afterward.
 def t_COMMENT(t):
-    r'\([^)]*\)'
-    t.value = t.value[1:-1]  # Remove parentheses
+    r'\((?P<comment>[^)]*)\)'
+    t.value = t.lexer.lexmatch.group("comment")
     return t
 
 
 def t_NAME(t):
     r'[^!,;.()]+'
-    t.value = t.value.strip()
+    # Strip here rather than in the regex since the name can have newlines or
+    # non-ASCII whitespace around it. Intern since the same climb names recur across
+    # log entries.
+    t.value = sys.intern(t.value.strip())
     return t
 
 def t_SEPARATOR(t):
@@ -55,8 +76,11 @@ def t_error(t):
     print(t.lexer.lexdata)
     t.lexer.skip(1)
 
-# Build the lexer
-lexer = lex.lex()
+@functools.cache
+def _get_lexer():
+    """Build the lexer on first use so importing this module is cheap."""
+    # Climb logs are ASCII so skip Unicode matching in the token regexes
+    return lex.lex(reflags=re.VERBOSE | re.ASCII)
 
 # Grammar rules for the parser
 def p_log(p):
@@ -69,7 +93,9 @@ def p_entry_list(p):
     '''entry_list : entry_list SEPARATOR entry
                   | entry'''
     if len(p) == 4:
-        p[0] = p[1] + [p[3]]
+        # Append in place rather than copying the list for every entry
+        p[1].append(p[3])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
@@ -77,9 +103,9 @@ def p_entry(p):
     '''entry : NAME
              | NAME COMMENT'''
     if len(p) == 3:
-        p[0] = {"name": p[1], "comment": p[2]}  # Remove parentheses
+        p[0] = Entry(p[1], p[2])
     else:
-        p[0] = {"name": p[1], "comment": ""}
+        p[0] = Entry(p[1], "")
 
 # Error rule for syntax errors
 def p_error(p):
@@ -87,12 +113,33 @@ def p_error(p):
     # Print the entire input string
     raise ValueError(p)
 
-# Build the parser
-parser = yacc.yacc()
+@functools.cache
+def _get_parser():
+    """Build the parser on first use so importing this module is cheap.
+
+    Under PyPy building the LR tables is fast enough that the pickle cache is not worth
+    it, otherwise reuse cached tables if available.
+    """
+    if platform.python_implementation() == "PyPy":
+        return yacc.yacc(debug=False, write_tables=False)
+    return yacc.yacc(debug=False, picklefile=str(PARSER_TABLES_PATH))
+
+
+def parse(log_entry):
+    """Parse a log entry string into a list of Entry named tuples.
+
+    Whitespace around names is stripped, including newlines and non-ASCII whitespace:
+
+    >>> parse("Armed,\\nObi")
+    [Entry(name='Armed', comment=''), Entry(name='Obi', comment='')]
+    >>> parse("Armed\\xa0, Obi (AS)")
+    [Entry(name='Armed', comment=''), Entry(name='Obi', comment='AS')]
+    """
+    return _get_parser().parse(log_entry, lexer=_get_lexer())
 
 # # Example usage
 # log_entry = "Armed, Obi (AS); lcimb (blah), Jedi Mind Tricks * 2 (TA working moves)."
 # #log_entry = "Armed,, Obi *2 (AS)"
-# parsed_log = parser.parse(log_entry)
+# parsed_log = parse(log_entry)
 
 # print(parsed_log)
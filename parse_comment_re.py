@@ -0,0 +1,54 @@
+"""Parse a string that contains climb log entries with a single regular expression.
+
+This gives the same names and comments as the PLY parser in parse_comment_ply.py and
+like it raises ValueError for text that is not a climb entry. The log entry grammar is
+regular, so one precompiled regex is enough and all of the scanning happens in the C
+regex engine. Climb names are interned since the same names recur across log entries.
+
+For example:
+
+>>> parse("Armed, Obi (AS); Jedi Mind Tricks * 2 (TA working moves).")
+[{'name': 'Armed', 'comment': ''}, {'name': 'Obi', 'comment': 'AS'}, {'name': 'Jedi Mind Tricks * 2', 'comment': 'TA working moves'}]
+"""
+
+import re
+import sys
+from typing import Iterator
+
+# One climb entry: a name, an optional parenthesized comment, then separators or the
+# end of the string. Surrounding whitespace is not captured.
+ENTRY_RE = re.compile(
+    r"\s*([^!,;.()\s][^!,;.()]*?)\s*(?:\(([^)]*)\))?\s*(?:[!,;.]+|$)"
+)
+
+
+def parse(log_entry: str) -> list[dict[str, str]]:
+    """Parse a log entry string into a list of {"name": ..., "comment": ...} dicts."""
+    return list(iter_entries(log_entry))
+
+
+def iter_entries(log_entry: str) -> Iterator[dict[str, str]]:
+    """Iterate over the {"name": ..., "comment": ...} dicts in a log entry string.
+
+    Entries are scanned as they are consumed, so memory does not grow with the
+    length of ``log_entry``.
+
+    Each entry must start where the previous one ended, so text that is not a climb
+    entry raises ValueError instead of being skipped:
+
+    >>> parse("x (y)z")
+    Traceback (most recent call last):
+    ...
+    ValueError: cannot parse climb entry at 'x (y)z' in 'x (y)z'
+    """
+    pos = 0
+    end = len(log_entry.rstrip())
+    while pos < end:
+        match = ENTRY_RE.match(log_entry, pos)
+        if match is None:
+            raise ValueError(
+                f"cannot parse climb entry at {log_entry[pos:]!r} in {log_entry!r}"
+            )
+        yield {"name": sys.intern(match[1]), "comment": match[2] or ""}
+        pos = match.end()
+
@@ -1,43 +1,31 @@
-from lark import Lark, Transformer
+import re
+import sys
 
-# Grammar definition for Lark
-grammar = r"""
-    start: entry (SEPARATOR entry)*
+from climb_parser_standalone import Lark_StandAlone, Transformer
 
-    entry: NAME COMMENT -> entry_with_comment
-         | NAME -> name_only
+# The grammar is in climbing_log.lark. After changing it, run
+# make_climb_parser_standalone.py to regenerate climb_parser_standalone.py, which has
+# the LALR tables precomputed so nothing is compiled at import.
 
-    NAME: /[^,()]+/
-    COMMENT: /\([^)]*\)/
-    SEPARATOR: /,+/
-
-    %ignore " "
-    %ignore "\t"
-"""
+# Name and optional parenthesized comment within an ENTRY token
+ENTRY_RE = re.compile(r"\s*([^()]*?)\s*(?:\(([^)]*)\))?\s*$")
 
 # Transformer to convert parse tree to desired output format
 class ClimbingLogTransformer(Transformer):
-    def entry_with_comment(self, items):
-        name, comment = items
-        return {"name": name.strip(), "comment": comment[1:-1]}  # Remove parentheses
-
-    def name_only(self, items):
-        name, = items
-        return {"name": name.strip(), "comment": ""}
-
-    def SEPARATOR(self, items):
-        return
+    def ENTRY(self, token):
+        name, comment = ENTRY_RE.match(token).groups()
+        # Intern since the same climb names recur across log entries
+        return {"name": sys.intern(name), "comment": comment or ""}
 
     def start(self, items):
         return items
 
-# Initialize Lark parser
-parser = Lark(grammar, start='start')
+# Initialize Lark parser. The transformer is applied during parsing so this returns
+# the list of entry dicts directly without building a parse tree.
+parser = Lark_StandAlone(transformer=ClimbingLogTransformer())
 
 # Example usage
 log_entry = "Armed, Obi (AS), Jedi Mind Tricks * 2 (TA working moves)"
 parsed_log = parser.parse(log_entry)
 
-print(parsed_log.pretty())
-print()
-print(ClimbingLogTransformer().transform(parsed_log))
+print(parsed_log)